@@ -1,62 +1,180 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, ORJSONResponse
 from pydantic import BaseModel
 import yt_dlp
 import os
-import uuid
+import secrets
 import time
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Tuple
 
-import requests
+import httpx
 import re
 import asyncio
-import glob
+import hashlib
+import itertools
+import math
+import multiprocessing
+import queue
+import orjson
+import redis
+from cachetools import TTLCache
+from redis import asyncio as aioredis
 from ytmusicapi import YTMusic
 import shutil
+import threading
 import zipfile
 
-from contextlib import asynccontextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from collections import OrderedDict
+from functools import lru_cache
+from contextlib import asynccontextmanager, contextmanager
 
 # Initialize YTMusic
 ytmusic = YTMusic()
 
+def newest_mtime(path: str) -> float:
+    """Latest modification time of a directory or of anything below it.
+
+    A directory's own mtime only changes when its direct entries do, not while
+    a download is writing into work/ further down.
+    """
+    newest = os.stat(path, follow_symlinks=False).st_mtime
+    for root, dirs, files in os.walk(path):
+        for name in itertools.chain(dirs, files):
+            try:
+                newest = max(newest, os.stat(os.path.join(root, name), follow_symlinks=False).st_mtime)
+            except FileNotFoundError:
+                pass
+    return newest
+
+def sweep_temp_dir() -> Tuple[int, int]:
+    """Deletes files and task directories older than 1 hour in the temp folder.
+
+    Directories of downloads still running in this process are always kept.
+    Returns how many entries were removed and how many could not be.
+    """
+    cutoff = time.time() - 3600 # 1 hour
+    removed = failed = 0
+    with os.scandir(TEMP_DIR) as it:
+        first = next(it, None)
+        # The folder is usually empty between downloads
+        if first is None: return removed, failed
+        # Where supported, unlink by name relative to one open directory fd instead of
+        # making the kernel resolve the full path again for every file
+        dir_fd = os.open(TEMP_DIR, os.O_RDONLY | os.O_DIRECTORY) if os.unlink in os.supports_dir_fd else None
+        try:
+            for entry in itertools.chain((first,), it):
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name in active_task_ids or newest_mtime(entry.path) >= cutoff: continue
+                        shutil.rmtree(entry.path)
+                    elif entry.stat(follow_symlinks=False).st_mtime >= cutoff:
+                        continue
+                    elif dir_fd is not None:
+                        os.unlink(entry.name, dir_fd=dir_fd)
+                    else:
+                        os.unlink(entry.path)
+                    removed += 1
+                except FileNotFoundError:
+                    pass # Already removed by its own task
+                except OSError:
+                    failed += 1
+        finally:
+            if dir_fd is not None: os.close(dir_fd)
+    return removed, failed
+
 async def auto_cleanup():
-    """Periodically deletes files older than 1 hour in the temp folder."""
+    """Periodically sweeps the temp folder without blocking the event loop."""
     while True:
         try:
-            now = time.time()
-            for f in glob.glob(os.path.join(TEMP_DIR, "*")):
-                if os.path.isfile(f):
-                    if os.stat(f).st_mtime < now - 3600: # 1 hour
-                        os.remove(f)
+            removed, failed = await asyncio.to_thread(sweep_temp_dir)
+            if removed or failed:
+                print(f"Auto-cleanup: removed {removed} old entries, {failed} could not be removed")
         except Exception as e:
             print(f"Auto-cleanup error: {e}")
         await asyncio.sleep(1800) # Run every 30 mins
 
+# Task ids whose files should be removed, drained in batches by deletion_worker
+deletion_queue: asyncio.Queue = asyncio.Queue()
+
+async def deletion_worker():
+    """Removes queued task directories in batches, at most every 500 ms."""
+    while True:
+        batch = {await deletion_queue.get()}
+        await asyncio.sleep(0.5)
+        while not deletion_queue.empty():
+            batch.add(deletion_queue.get_nowait())
+        await asyncio.gather(*(asyncio.to_thread(cleanup_task_files, task_id) for task_id in batch))
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup: Start the background cleanup task
+    # Startup: Start the background cleanup tasks
     cleanup_task = asyncio.create_task(auto_cleanup())
+    deletion_task = asyncio.create_task(deletion_worker())
+    download_tasks = [asyncio.create_task(download_queue_worker()) for _ in range(DOWNLOAD_WORKERS)]
+    # Build the common /info instances in the background rather than on the first request
+    warm_task = asyncio.create_task(asyncio.to_thread(warm_ydl_pools))
+    start_vtt_parse_pool()
     yield
-    # Shutdown: Stop the task
+    # Shutdown: Stop the tasks
     cleanup_task.cancel()
+    deletion_task.cancel()
+    for download_task in download_tasks: download_task.cancel()
+    await http_client.aclose()
+    # A running to_thread call cannot be cancelled; let it finish so no instance is added after the pools close
+    try:
+        await warm_task
+    except Exception as e:
+        print(f"YoutubeDL warm-up failed: {e}")
+    close_ydl_pools()
+    if vtt_parse_pool: vtt_parse_pool.shutdown(wait=False, cancel_futures=True)
+    if redis_async_client: await redis_async_client.aclose()
+    if redis_pubsub_client: await redis_pubsub_client.aclose()
+
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+
+@app.exception_handler(redis.RedisError)
+async def task_store_unavailable(request: Request, exc: redis.RedisError):
+    """Task state cannot be read or written while Redis is down; say so instead of a bare 500."""
+    print(f"DEBUG: Redis error: {exc}")
+    return ORJSONResponse(status_code=503, content={"detail": "Task store unavailable, try again later"})
 
-app = FastAPI(lifespan=lifespan)
+# aria2c is optional; without it yt-dlp's built-in fragment downloader is used
+ARIA2C_AVAILABLE = shutil.which('aria2c') is not None
 
-# Limit to 3 concurrent downloads
-download_semaphore = asyncio.Semaphore(3)
+# Downloads wait in a bounded queue served by 3 workers; /download answers 503 once it is full.
+# FFmpeg post-processing is limited to 2 concurrent runs, taken from yt-dlp's thread,
+# hence a threading semaphore.
+DOWNLOAD_WORKERS = 3
+download_queue: asyncio.Queue = asyncio.Queue(maxsize=50)
+postprocess_semaphore = threading.BoundedSemaphore(min(os.cpu_count() or 1, 2))
+# Shared HTTP client so auxiliary fetches (subtitles) reuse pooled HTTP/2 connections
+http_client = httpx.AsyncClient(http2=True, timeout=10.0, limits=httpx.Limits(max_connections=20, max_keepalive_connections=20))
+MAX_VTT_BYTES = 4 * 1024 * 1024
+TRANSCRIPT_TIMEOUT = 20.0
+# Captions larger than this are parsed in a worker process, so the parse doesn't hold the GIL
+VTT_PROCESS_PARSE_BYTES = 256 * 1024
+VTT_PARSE_WORKERS = 2
+vtt_parse_pool: Optional[ProcessPoolExecutor] = None
+
+# Strong references to running download tasks; the loop only keeps weak ones
+running_downloads = set()
+# Ids of tasks whose download_worker has not finished yet, so the temp sweep leaves them alone
+active_task_ids = set()
+
+def task_dir(task_id: str) -> str:
+    """Every task keeps all of its files in its own TEMP_DIR subdirectory."""
+    return os.path.join(TEMP_DIR, task_id)
 
 def cleanup_task_files(task_id: str):
-    """Removes all files in TEMP_DIR that start with the task_id."""
-    files = glob.glob(os.path.join(TEMP_DIR, f"{task_id}*"))
-    for f in files:
-        try:
-            if os.path.exists(f):
-                if os.path.isfile(f): os.remove(f)
-                else: shutil.rmtree(f)
-        except Exception as e:
-            print(f"Failed to delete {f}: {e}")
+    """Removes the task's directory, and with it every file the task produced."""
+    try:
+        shutil.rmtree(task_dir(task_id))
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"Failed to delete files of task {task_id}: {e}")
 
 app.add_middleware(
     CORSMiddleware,
@@ -73,7 +191,114 @@ for d in [TEMP_DIR, LIBRARY_DIR]:
     if not os.path.exists(d):
         os.makedirs(d, exist_ok=True)
 
-tasks: Dict[str, dict] = {}
+# Task state lives in Redis when REDIS_URL is set so that every uvicorn worker
+# sees the same progress; otherwise it falls back to this process-local dict.
+REDIS_URL = os.environ.get("REDIS_URL")
+# Short timeouts, so a slow or unreachable Redis fails fast instead of stalling requests.
+# redis_client is only used from worker threads; async code uses redis_async_client.
+REDIS_TIMEOUT = 2.0
+redis_client = redis.Redis.from_url(REDIS_URL, decode_responses=True, socket_timeout=REDIS_TIMEOUT, socket_connect_timeout=REDIS_TIMEOUT) if REDIS_URL else None
+redis_async_client = aioredis.Redis.from_url(REDIS_URL, decode_responses=True, socket_timeout=REDIS_TIMEOUT, socket_connect_timeout=REDIS_TIMEOUT) if REDIS_URL else None
+# Pub/sub reads wait for the next update however long it takes, so no read timeout there
+redis_pubsub_client = aioredis.Redis.from_url(REDIS_URL, decode_responses=True, socket_connect_timeout=REDIS_TIMEOUT) if REDIS_URL else None
+TASK_TTL = 24 * 3600 # Abandoned tasks expire after a day
+INFO_CACHE_TTL = 600 # /info results are reused for 10 minutes
+
+# Least recently used first; bounded so a long-running server does not grow forever.
+# Guarded by tasks_lock since progress hooks write from yt-dlp threads.
+TASKS_MAX = 10_000
+tasks: "OrderedDict[str, dict]" = OrderedDict()
+tasks_lock = threading.Lock()
+# Open /ws/status sockets per task, as (event loop, update queue) pairs
+task_listeners: Dict[str, set] = {}
+
+def task_key(task_id: str) -> str:
+    return f"task:{task_id}"
+
+async def new_task(task_id: str):
+    """Registers a freshly queued task."""
+    state = {'status': 'queued', 'progress': 0}
+    if redis_async_client:
+        async with redis_async_client.pipeline() as pipe:
+            pipe.hset(task_key(task_id), mapping=state)
+            pipe.expire(task_key(task_id), TASK_TTL)
+            await pipe.execute()
+    else:
+        with tasks_lock:
+            tasks[task_id] = state
+            evicted = [tasks.popitem(last=False)[0] for _ in range(len(tasks) - TASKS_MAX)]
+        for old_id in evicted:
+            deletion_queue.put_nowait(old_id)
+
+def set_task(task_id: str, **fields):
+    """Updates one or more fields of a task and pushes them to its subscribers in a single round trip.
+
+    Blocks on Redis, so async code calls it through asyncio.to_thread.
+    """
+    if redis_client:
+        with redis_client.pipeline(transaction=False) as pipe:
+            pipe.hset(task_key(task_id), mapping=fields)
+            pipe.publish(f"progress:{task_id}", orjson.dumps(fields))
+            pipe.execute()
+    else:
+        with tasks_lock:
+            task = tasks.get(task_id)
+            if task is None: return
+            task.update(fields)
+            tasks.move_to_end(task_id)
+        # May run in a yt-dlp thread, so hand the update to each listener's loop
+        for loop, updates in list(task_listeners.get(task_id, ())):
+            loop.call_soon_threadsafe(updates.put_nowait, fields)
+
+async def get_task(task_id: str) -> Optional[dict]:
+    if redis_async_client:
+        state = await redis_async_client.hgetall(task_key(task_id))
+        if not state: return None
+        state['progress'] = int(float(state.get('progress', 0)))
+        return state
+    with tasks_lock:
+        task = tasks.get(task_id)
+        if task is None: return None
+        tasks.move_to_end(task_id)
+        # A copy, so the response is not serialised while a hook is updating it
+        return dict(task)
+
+def forget_task(task_id: str):
+    with tasks_lock:
+        tasks.pop(task_id, None)
+
+@asynccontextmanager
+async def task_updates(task_id: str):
+    """Subscribes to a task's changes; yields a coroutine function returning the next batch of changed fields."""
+    if redis_pubsub_client:
+        pubsub = redis_pubsub_client.pubsub()
+        await pubsub.subscribe(f"progress:{task_id}")
+        async def next_update() -> dict:
+            while True:
+                msg = await pubsub.get_message(ignore_subscribe_messages=True, timeout=None)
+                if msg: return orjson.loads(msg['data'])
+        try:
+            yield next_update
+        finally:
+            await pubsub.aclose()
+    else:
+        updates: asyncio.Queue = asyncio.Queue()
+        listener = (asyncio.get_running_loop(), updates)
+        task_listeners.setdefault(task_id, set()).add(listener)
+        try:
+            yield updates.get
+        finally:
+            listeners = task_listeners.get(task_id)
+            if listeners is not None:
+                listeners.discard(listener)
+                if not listeners: task_listeners.pop(task_id, None)
+
+async def expire_task(task_id: str, seconds: int):
+    """Forgets a task after `seconds`."""
+    if redis_async_client:
+        await redis_async_client.expire(task_key(task_id), seconds)
+    else:
+        asyncio.get_running_loop().call_later(seconds, forget_task, task_id)
 
 class VideoRequest(BaseModel):
     url: str
@@ -96,25 +321,220 @@ class DownloadRequest(BaseModel):
     is_music: bool = False
     is_collection: bool = False
 
+# Seconds per field for "ss", "mm:ss" and "hh:mm:ss", indexed by field count
+TIME_MULTS = ((1.0,), (60.0, 1.0), (3600.0, 60.0, 1.0))
+
 def parse_time(timestr: str) -> float:
-    if not timestr: return 0.0
+    parts = timestr.split(':') if timestr else ()
+    if not 1 <= len(parts) <= 3: return 0.0
     try:
-        parts = list(map(int, timestr.split(':')))
-        if len(parts) == 1: return float(parts[0])
-        if len(parts) == 2: return parts[0] * 60 + parts[1]
-        if len(parts) == 3: return parts[0] * 3600 + parts[1] * 60 + parts[2]
-        return 0.0
-    except:
+        values = [float(p) for p in parts]
+    except ValueError:
         return 0.0
+    # float() also accepts signs, "inf" and "nan", none of which are a timestamp
+    if not all(0.0 <= v < math.inf for v in values): return 0.0
+    return sum(v * m for v, m in zip(values, TIME_MULTS[len(parts) - 1]))
+
+# One cue: the start timestamp split into groups, then the cue text up to the next blank line
+VTT_RE = re.compile(r'(\d{2}):(\d{2}):(\d{2})\.(\d{3})\s+-->\s+\d{2}:\d{2}:\d{2}\.\d{3}[^\n]*\n(.*?)(?=\n\s*\n|\Z)', re.S)
+# Inline cue markup such as <c>, </c> and the <00:00:01.234> word timings of auto-captions
+TAG_RE = re.compile(r'<[^>]*>')
+# Empty line between cue blocks, LF or CRLF. Not \s*: auto-caption cues start with a
+# whitespace-only text line, and splitting there would part a cue from its text
+VTT_BLOCK_END_RE = re.compile(r'\r?\n\r?\n')
+
+def empty_transcript() -> Dict[str, list]:
+    """Transcripts are kept as parallel lists: cue i starts at start[i] seconds and reads text[i]."""
+    return {'start': [], 'text': []}
+
+def parse_vtt(vtt_text: str, transcript: Optional[Dict[str, list]] = None) -> Dict[str, list]:
+    """Turns WebVTT cues into {'start': [seconds], 'text': [...]} in a single regex pass.
+
+    Appends to `transcript` when given, so a document can be parsed piece by piece.
+    """
+    if transcript is None: transcript = empty_transcript()
+    add_start, add_text = transcript['start'].append, transcript['text'].append
+    last_text = transcript['text'][-1] if transcript['text'] else None
+    for m in VTT_RE.finditer(vtt_text):
+        text = ' '.join(TAG_RE.sub('', m[5]).split())
+        # Auto-captions repeat the previous line while the next one scrolls in
+        if not text or text == last_text: continue
+        add_start(int(m[1]) * 3600 + int(m[2]) * 60 + int(m[3]) + int(m[4]) / 1000)
+        add_text(text)
+        last_text = text
+    return transcript
+
+def find_vtt_url(info: dict) -> Optional[str]:
+    """Picks an English VTT track, preferring uploaded subtitles over automatic captions."""
+    for source in ('subtitles', 'automatic_captions'):
+        tracks = info.get(source) or {}
+        langs = sorted((l for l in tracks if l == 'en' or l.startswith('en-')), key=lambda l: l != 'en')
+        for lang in langs:
+            url = next((f.get('url') for f in tracks[lang] or [] if f.get('ext') == 'vtt'), None)
+            if url: return url
+    return None
+
+def start_vtt_parse_pool():
+    """Starts the caption parsing processes at startup.
+
+    Each spawned worker imports this module, which takes a good fraction of a second,
+    so that is paid up front instead of by the first large caption.
+    """
+    global vtt_parse_pool
+    # spawn rather than fork: forking a process with running threads can deadlock the child
+    vtt_parse_pool = ProcessPoolExecutor(max_workers=VTT_PARSE_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+    # Workers are only launched as jobs arrive, so hand each one an empty document
+    for _ in range(VTT_PARSE_WORKERS): vtt_parse_pool.submit(parse_vtt, "")
+
+def complete_blocks(vtt_text: str) -> Tuple[str, str]:
+    """Splits off the trailing cue block that may still be incomplete."""
+    last_end = None
+    for last_end in VTT_BLOCK_END_RE.finditer(vtt_text): pass
+    if not last_end: return "", vtt_text
+    return vtt_text[:last_end.start()], vtt_text[last_end.end():]
+
+async def fetch_transcript(vtt_url: str) -> Dict[str, list]:
+    """Streams the VTT file and parses every cue block as soon as it is complete.
+
+    Large files are read whole instead and parsed in a worker process.
+    """
+    transcript = empty_transcript()
+    pending = ""
+    try:
+        async with http_client.stream("GET", vtt_url) as resp:
+            resp.raise_for_status()
+            in_process = vtt_parse_pool is not None and int(resp.headers.get('content-length') or 0) > VTT_PROCESS_PARSE_BYTES
+            async for chunk in resp.aiter_text(chunk_size=64 * 1024):
+                if resp.num_bytes_downloaded > MAX_VTT_BYTES:
+                    print(f"DEBUG: Transcript larger than {MAX_VTT_BYTES} bytes, keeping the first part only")
+                    pending = complete_blocks(pending)[0]
+                    break
+                pending += chunk
+                if in_process: continue
+                blocks, pending = complete_blocks(pending)
+                if blocks: parse_vtt(blocks, transcript)
+        if in_process:
+            return await asyncio.get_running_loop().run_in_executor(vtt_parse_pool, parse_vtt, pending)
+        parse_vtt(pending, transcript)
+    except Exception as e:
+        print(f"DEBUG: Transcript fetch failed: {e}")
+    return transcript
+
+def list_formats(info: dict) -> List[dict]:
+    """One selectable format per resolution (360p and up), highest first."""
+    by_height = {}
+    # yt-dlp lists formats worst to best, so walk backwards to keep the best one per height
+    for f in reversed(info.get('formats') or []):
+        h = f.get('height')
+        if h and h >= 360 and h not in by_height and f.get('format_id'):
+            by_height[h] = {'format_id': f['format_id'], 'resolution': f"{h}p", 'ext': f.get('ext', 'mp4')}
+    return [by_height[h] for h in sorted(by_height, reverse=True)]
+
+UNSAFE_PATH_RE = re.compile(r'[\\/*?:"<>|]')
 
 def sanitize_path(name: str) -> str:
     if not name: return "Unknown"
-    return re.sub(r'[\\/*?:"<>|]', "", name).strip()
+    return UNSAFE_PATH_RE.sub("", name).strip()
+
+MEDIA_EXTENSIONS = {'.mp4', '.mp3', '.m4a', '.webm', '.mkv', '.wav'}
+IMAGE_EXTENSIONS = {'.jpg', '.png', '.webp'}
+LIBRARY_EXTENSIONS = MEDIA_EXTENSIONS | IMAGE_EXTENSIONS
+
+def file_ext(name: str) -> str:
+    return os.path.splitext(name)[1].lower()
 
-async def download_worker(task_id: str, request: DownloadRequest):
-    async with download_semaphore:
+def deliver_files(task_id: str, request: DownloadRequest, info: dict, task_work_dir: str, lib_target_dir: str):
+    """Copies a finished download into the library and stages the browser file.
+
+    Runs in a worker thread so the directory scan and copies never block the event loop.
+    """
+    # 2. After download, sync to LIBRARY and prepare return
+    with os.scandir(task_work_dir) as it:
+        downloaded_files = [e.name for e in it if e.is_file() and file_ext(e.name) in LIBRARY_EXTENSIONS]
+    
+    # Copy all files to the library for Plex (persistent)
+    for f in downloaded_files:
+        src = os.path.join(task_work_dir, f)
+        # If it's a thumbnail and we want 'cover.jpg' logic
+        if file_ext(f) in IMAGE_EXTENSIONS and request.artist:
+            dst = os.path.join(lib_target_dir, "cover.jpg")
+            if not os.path.exists(dst): shutil.copy2(src, dst)
+        else:
+            dst = os.path.join(lib_target_dir, f)
+            shutil.copy2(src, dst)
+
+    # 3. Handle browser download delivery
+    if request.is_collection:
+        # Create a zip of the task_work_dir
+        zip_filename = f"{sanitize_path(request.title or info.get('title') or 'collection')}.zip"
+        zip_path = os.path.join(task_dir(task_id), f"{task_id}.zip")
+        
+        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+            for f in downloaded_files:
+                zipf.write(os.path.join(task_work_dir, f), f)
+        
+        set_task(task_id, status='completed', file_path=zip_path, filename=f"{task_id}.zip", download_name=zip_filename)
+    else:
+        # Single file delivery; yt-dlp reports where the final file ended up after post-processing
+        downloads = info.get('requested_downloads') or [{}]
+        src = downloads[0].get('filepath')
+        if not src or not os.path.isfile(src):
+            # Older yt-dlp versions do not report it, so fall back to the scanned files
+            src = next((os.path.join(task_work_dir, f) for f in downloaded_files if file_ext(f) in MEDIA_EXTENSIONS), None)
+        if src:
+            # Rename task_id file if it's there
+            ext = file_ext(src)[1:]
+            final_name = f"{task_id}.{ext}"
+            final_path = os.path.join(task_dir(task_id), final_name)
+            shutil.move(src, final_path)
+            
+            set_task(task_id, status='completed', file_path=final_path, filename=final_name,
+                     download_name=f"{sanitize_path(request.title or info.get('title') or 'video')}.{ext}")
+        else:
+            set_task(task_id, status='error', error="No media file found after download")
+
+    # Cleanup the task work dir, only the delivered file stays behind
+    shutil.rmtree(task_work_dir)
+
+# Download options that are the same for every task; run_ytdl copies them and adds the per-task ones
+BASE_YDL_OPTS = {
+    'quiet': True,
+    'concurrent_fragment_downloads': 5,
+    'sponsorblock_remove': ['sponsor', 'selfpromo', 'interaction', 'intro', 'outro', 'preview'],
+    'writethumbnail': True,
+    'writemetadata': True,
+}
+if ARIA2C_AVAILABLE:
+    # Let aria2c fetch HLS/DASH fragments natively instead of yt-dlp's Python downloader
+    BASE_YDL_OPTS['external_downloader'] = {'m3u8': 'aria2c', 'dash': 'aria2c'}
+    BASE_YDL_OPTS['external_downloader_args'] = {'aria2c': ['-x16', '-s16', '-k1M', '--console-log-level=warn']}
+
+VIDEO_POSTPROCESSORS = (
+    {'key': 'FFmpegMetadata', 'add_chapters': True},
+    {'key': 'EmbedThumbnail'},
+)
+AUDIO_POSTPROCESSORS = ({'key': 'FFmpegExtractAudio', 'preferredcodec': 'mp3', 'preferredquality': '320'},) + VIDEO_POSTPROCESSORS
+
+async def download_queue_worker():
+    """Takes queued downloads one at a time, moving on as soon as a job has finished fetching."""
+    while True:
+        task_id, request = await download_queue.get()
+        fetch_done = asyncio.Event()
+        job = asyncio.create_task(download_worker(task_id, request, fetch_done))
+        running_downloads.add(job)
+        job.add_done_callback(running_downloads.discard)
+        try:
+            await fetch_done.wait()
+        finally:
+            download_queue.task_done()
+
+async def download_worker(task_id: str, request: DownloadRequest, fetch_done: asyncio.Event):
+    # `fetch_done` frees this job's queue worker for the next job. It is set as soon as
+    # FFmpeg post-processing starts (see postprocessor_hook), or when the job ends.
+    active_task_ids.add(task_id)
+    try:
         cleanup_task_files(task_id)
-        tasks[task_id]['status'] = 'processing'
+        await asyncio.to_thread(set_task, task_id, status='processing')
         
         # 1. Setup paths
         artist_folder = sanitize_path(request.artist or "Downloads")
@@ -128,18 +548,35 @@ async def download_worker(task_id: str, request: DownloadRequest):
         os.makedirs(lib_target_dir, exist_ok=True)
         
         # The temporary work path for this specific task (to be zipped)
-        # We put it inside temp_downloads to ensure cleanup
-        task_work_dir = os.path.join(TEMP_DIR, task_id)
+        # We put it inside the task's temp dir to ensure cleanup
+        task_work_dir = os.path.join(task_dir(task_id), "work")
         os.makedirs(task_work_dir, exist_ok=True)
 
+        last_update = 0.0
         def progress_hook(d):
+            nonlocal last_update
             if d['status'] == 'downloading':
-                p_str = d.get('_percent_str', '0%').strip().replace('%', '')
-                try:
-                    tasks[task_id]['progress'] = float(p_str)
-                except: pass
+                total = d.get('total_bytes') or d.get('total_bytes_estimate')
+                now = time.monotonic()
+                # yt-dlp calls this for every chunk; a few updates per second are plenty
+                if total and now - last_update >= 0.25:
+                    last_update = now
+                    # Estimated totals are floats and may undershoot the real size
+                    set_task(task_id, progress=min(100, int((d.get('downloaded_bytes') or 0) * 100 / total)))
             elif d['status'] == 'finished':
-                tasks[task_id]['progress'] = 100
+                set_task(task_id, progress=100)
+
+        loop = asyncio.get_running_loop()
+        postprocessing = False
+        def postprocessor_hook(d):
+            nonlocal postprocessing
+            # Collections interleave downloads and post-processing per track, so they hold their queue worker throughout
+            if d['status'] == 'started' and not postprocessing and not request.is_collection:
+                # Wait for an FFmpeg slot before freeing the queue worker, so jobs waiting
+                # on FFmpeg count against the 3 workers and cannot tie up executor threads
+                postprocess_semaphore.acquire()
+                postprocessing = True
+                loop.call_soon_threadsafe(fetch_done.set)
 
         try:
             def run_ytdl():
@@ -152,28 +589,16 @@ async def download_worker(task_id: str, request: DownloadRequest):
                     out_tmpl = os.path.join(task_work_dir, f"{task_id}.%(ext)s")
 
                 ydl_opts = {
+                    **BASE_YDL_OPTS,
                     'outtmpl': out_tmpl,
-                    'quiet': True,
                     'noplaylist': not request.is_collection,
                     'progress_hooks': [progress_hook],
-                    'concurrent_fragment_downloads': 5,
+                    'postprocessor_hooks': [postprocessor_hook],
                     'format': 'bestvideo+bestaudio/best' if not request.audio_only else 'bestaudio/best',
-                    'sponsorblock_remove': ['sponsor', 'selfpromo', 'interaction', 'intro', 'outro', 'preview'],
-                    'writethumbnail': True,
-                    'writemetadata': True,
-                    'postprocessors': [
-                        {'key': 'FFmpegMetadata', 'add_chapters': True},
-                        {'key': 'EmbedThumbnail'},
-                    ],
+                    'postprocessors': [dict(pp) for pp in (AUDIO_POSTPROCESSORS if request.audio_only else VIDEO_POSTPROCESSORS)],
                 }
 
-                if request.audio_only:
-                    ydl_opts['postprocessors'].insert(0, {
-                        'key': 'FFmpegExtractAudio',
-                        'preferredcodec': 'mp3',
-                        'preferredquality': '320',
-                    })
-                elif request.format_id != "best":
+                if not request.audio_only and request.format_id != "best":
                     ydl_opts['format'] = f"{request.format_id}+bestaudio/best"
                     ydl_opts['merge_output_format'] = 'mp4'
 
@@ -186,87 +611,149 @@ async def download_worker(task_id: str, request: DownloadRequest):
                     ydl_opts['prefer_ffmpeg'] = True
 
                 with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                    ydl.download([request.url])
+                    # extract_info(download=True) is what download() runs, but it also hands back the metadata
+                    return ydl.extract_info(request.url, download=True)
 
-            await asyncio.to_thread(run_ytdl)
+            try:
+                info = await asyncio.to_thread(run_ytdl)
+            finally:
+                if postprocessing: postprocess_semaphore.release()
 
-            # 2. After download, sync to LIBRARY and prepare return
-            valid_extensions = ('.mp4', '.mp3', '.m4a', '.webm', '.mkv', '.wav', '.jpg', '.png', '.webp')
-            downloaded_files = [f for f in os.listdir(task_work_dir) if f.lower().endswith(valid_extensions)]
-            
-            # Copy all files to the library for Plex (persistent)
-            for f in downloaded_files:
-                src = os.path.join(task_work_dir, f)
-                # If it's a thumbnail and we want 'cover.jpg' logic
-                if f.lower().endswith(('.jpg', '.png', '.webp')) and request.artist:
-                    dst = os.path.join(lib_target_dir, "cover.jpg")
-                    if not os.path.exists(dst): shutil.copy2(src, dst)
-                else:
-                    dst = os.path.join(lib_target_dir, f)
-                    shutil.copy2(src, dst)
-
-            # 3. Handle browser download delivery
-            if request.is_collection:
-                # Create a zip of the task_work_dir
-                zip_filename = f"{sanitize_path(request.title or 'collection')}.zip"
-                zip_path = os.path.join(TEMP_DIR, f"{task_id}.zip")
-                
-                with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                    for f in downloaded_files:
-                        zipf.write(os.path.join(task_work_dir, f), f)
-                
-                tasks[task_id]['status'] = 'completed'
-                tasks[task_id]['file_path'] = zip_path
-                tasks[task_id]['filename'] = f"{task_id}.zip"
-                tasks[task_id]['download_name'] = zip_filename
-            else:
-                # Single file delivery
-                media_files = [f for f in downloaded_files if f.lower().endswith(('.mp4', '.mp3', '.m4a', '.webm', '.mkv', '.wav'))]
-                if media_files:
-                    # Rename task_id file if it's there
-                    src = os.path.join(task_work_dir, media_files[0])
-                    ext = os.path.splitext(media_files[0])[1][1:]
-                    final_name = f"{task_id}.{ext}"
-                    final_path = os.path.join(TEMP_DIR, final_name)
-                    shutil.move(src, final_path)
-                    
-                    tasks[task_id]['status'] = 'completed'
-                    tasks[task_id]['file_path'] = final_path
-                    tasks[task_id]['filename'] = final_name
-                    tasks[task_id]['download_name'] = f"{sanitize_path(request.title or 'video')}.{ext}"
-                else:
-                    tasks[task_id]['status'] = 'error'
-                    tasks[task_id]['error'] = "No media file found after download"
-
-            # Cleanup the task work dir
-            shutil.rmtree(task_work_dir)
+            await asyncio.to_thread(deliver_files, task_id, request, info or {}, task_work_dir, lib_target_dir)
 
         except Exception as e:
-            tasks[task_id]['status'] = 'error'
-            tasks[task_id]['error'] = str(e)
-            if os.path.exists(task_work_dir): shutil.rmtree(task_work_dir)
+            await asyncio.to_thread(set_task, task_id, status='error', error=str(e))
+            await asyncio.to_thread(cleanup_task_files, task_id)
+    finally:
+        active_task_ids.discard(task_id)
+        fetch_done.set()
+
+# Idle YoutubeDL instances for /info, one pool per option set
+ydl_pools: Dict[tuple, queue.SimpleQueue] = {}
+
+@contextmanager
+def pooled_ydl(opts: dict, playlist_items: Optional[str] = None):
+    """Lends out an idle YoutubeDL built with `opts`, creating one only when none is free.
+
+    Constructing a YoutubeDL loads every extractor, so instances are reused across
+    requests. An instance is only ever used by one thread at a time.
+    """
+    key = tuple(sorted((k, tuple(v) if isinstance(v, list) else v) for k, v in opts.items()))
+    pool = ydl_pools.setdefault(key, queue.SimpleQueue())
+    try:
+        ydl = pool.get_nowait()
+    except queue.Empty:
+        ydl = yt_dlp.YoutubeDL(dict(opts))
+    # Paging changes on every call, so it is set per loan instead of being part of the key
+    ydl.params['playlist_items'] = playlist_items
+    try:
+        yield ydl
+    finally:
+        pool.put(ydl)
+
+def warm_ydl_pools():
+    """Puts one ready instance in the pools every single-video lookup goes through."""
+    for opts in ({'quiet': True, 'extract_flat': 'in_playlist', 'noplaylist': True}, video_info_opts(False)):
+        with pooled_ydl(opts):
+            pass
+
+def close_ydl_pools():
+    for pool in ydl_pools.values():
+        while not pool.empty():
+            pool.get_nowait().close()
+
+def video_info_opts(is_music: bool) -> dict:
+    """Options for a full single-video lookup; subtitles are only needed outside YouTube Music."""
+    opts = {'quiet': True, 'extract_flat': False, 'noplaylist': True}
+    if not is_music:
+        opts.update({'writesubtitles': True, 'writeautomaticsub': True, 'subtitleslangs': ['en.*', 'en', 'en-US', 'en-GB', '.*']})
+    return opts
+
+def info_cache_key(request: VideoRequest) -> str:
+    raw = f"{request.url}|{request.tab or ''}|{request.offset or 0}"
+    return f"info:{hashlib.sha1(raw.encode()).hexdigest()}"
+
+# Without Redis, /info results are cached in-process instead. Only touched from the event loop.
+# Bounded by the serialised size of the responses, since a channel page weighs far more than a video.
+INFO_CACHE_BYTES = 32 * 1024 * 1024
+info_cache = TTLCache(maxsize=INFO_CACHE_BYTES, ttl=INFO_CACHE_TTL, getsizeof=lambda response: len(orjson.dumps(response)))
+
+async def get_cached_info(key: str) -> Optional[dict]:
+    if redis_async_client:
+        # The cache is an optimisation; if Redis is unavailable, treat it as a miss
+        try:
+            cached = await redis_async_client.get(key)
+        except redis.RedisError as e:
+            print(f"DEBUG: Info cache read failed: {e}")
+            return None
+        return orjson.loads(cached) if cached else None
+    return info_cache.get(key)
+
+async def cache_info(key: str, response: dict):
+    if redis_async_client:
+        try:
+            await redis_async_client.setex(key, INFO_CACHE_TTL, orjson.dumps(response))
+        except redis.RedisError as e:
+            print(f"DEBUG: Info cache write failed: {e}")
+    else:
+        try:
+            info_cache[key] = response
+        except ValueError:
+            pass # Larger than the whole cache
+
+# /info lookups in progress, so concurrent requests for the same page share one extraction
+info_inflight: Dict[str, asyncio.Task] = {}
+# Limit to 5 concurrent /info extractions, to keep worker threads free and YouTube from rate-limiting us
+info_semaphore = asyncio.Semaphore(5)
 
 @app.post("/info")
-def get_video_info(request: VideoRequest):
+async def get_video_info(request: VideoRequest):
+    key = info_cache_key(request)
+    cached = await get_cached_info(key)
+    if cached is not None: return cached
+    lookup = info_inflight.get(key)
+    if lookup is None:
+        lookup = asyncio.create_task(load_video_info(request, key))
+        info_inflight[key] = lookup
+        lookup.add_done_callback(lambda _: info_inflight.pop(key, None))
+    # Shielded so a client that disconnects does not cancel the lookup for everyone else
+    return await asyncio.shield(lookup)
+
+async def load_video_info(request: VideoRequest, key: str) -> dict:
+    async with info_semaphore:
+        response = await asyncio.to_thread(build_video_info, request)
+    await cache_info(key, response)
+    return response
+
+# URL shapes that /info dispatches on
+WATCH_URL_RE = re.compile(r'watch\?v=|youtu\.be/')
+CHANNEL_URL_RE = re.compile(r'/(?:@|channel/|c/|user/)')
+
+@lru_cache(maxsize=256)
+def split_channel_url(url: str) -> Tuple[str, str]:
+    """Cleans a channel URL and extracts its identifier (handle or ID)."""
+    clean_url = url.split('?')[0].split('#')[0].rstrip('/')
+    parts = clean_url.split('/')
+    
+    # The identifier is usually the last part (e.g., @Artist or UC...)
+    # unless it's in the /channel/ID format
+    identifier = parts[-1]
+    if "/channel/" in clean_url:
+        identifier = parts[parts.index("channel") + 1]
+    return clean_url, identifier
+
+def build_video_info(request: VideoRequest) -> dict:
+    """Runs the blocking yt-dlp/ytmusicapi lookups behind /info."""
     print(f"DEBUG: Received /info request for URL: {request.url}, Tab: {request.tab}")
     try:
         is_music = "music.youtube.com" in request.url
-        is_watch = "watch?v=" in request.url or "youtu.be/" in request.url
-        is_channel = not is_watch and ("/@" in request.url or "/channel/" in request.url or "/c/" in request.url or "/user/" in request.url or (is_music and "/channel/" in request.url) or (is_music and "/browse/MPAD" in request.url))
+        is_watch = WATCH_URL_RE.search(request.url) is not None
+        is_channel = not is_watch and (CHANNEL_URL_RE.search(request.url) is not None or (is_music and "/browse/MPAD" in request.url))
         
         print(f"DEBUG: is_music={is_music}, is_watch={is_watch}, is_channel={is_channel}")
         
         if is_channel:
-            # Clean the URL and extract the identifier (handle or ID)
-            clean_url = request.url.split('?')[0].split('#')[0].rstrip('/')
-            parts = clean_url.split('/')
-            
-            # The identifier is usually the last part (e.g., @Artist or UC...)
-            # unless it's in the /channel/ID format
-            identifier = parts[-1]
-            if "/channel/" in clean_url:
-                identifier = parts[parts.index("channel") + 1]
-            
+            clean_url, identifier = split_channel_url(request.url)
             print(f"DEBUG: Identifier extracted: {identifier}")
             
             # Resolve the actual channel ID if it's a handle or other type
@@ -274,7 +761,7 @@ def get_video_info(request: VideoRequest):
             if identifier.startswith('@') or "/c/" in clean_url or "/user/" in clean_url:
                 try:
                     print(f"DEBUG: Resolving handle/vanity URL: {clean_url}")
-                    with yt_dlp.YoutubeDL({'quiet': True, 'extract_flat': True}) as ydl:
+                    with pooled_ydl({'quiet': True, 'extract_flat': True}) as ydl:
                         res = ydl.extract_info(clean_url, download=False)
                         channel_id = res.get('channel_id') or identifier
                     print(f"DEBUG: Resolved channel_id: {channel_id}")
@@ -365,7 +852,7 @@ def get_video_info(request: VideoRequest):
                                     pl_id = b_id[2:] if b_id.startswith('VL') else b_id
                                     pl_url = f"https://www.youtube.com/playlist?list={pl_id}"
                                     print(f"DEBUG: Fetching videos slice {start}-{end} via yt-dlp", flush=True)
-                                    with yt_dlp.YoutubeDL({'quiet': True, 'extract_flat': True, 'playlist_items': f"{start}:{end}"}) as ydl:
+                                    with pooled_ydl({'quiet': True, 'extract_flat': True}, playlist_items=f"{start}:{end}") as ydl:
                                         res = ydl.extract_info(pl_url, download=False)
                                         results = res.get('entries', [])
                                         for r in results:
@@ -405,8 +892,7 @@ def get_video_info(request: VideoRequest):
                         for sub_tab in ["videos", "releases", "playlists"]:
                             try:
                                 tab_url = f"https://www.youtube.com/channel/{channel_id}/{sub_tab}"
-                                ydl_opts = {'quiet': True, 'extract_flat': 'in_playlist', 'playlist_items': f"{start}:{end}"}
-                                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                                with pooled_ydl({'quiet': True, 'extract_flat': 'in_playlist'}, playlist_items=f"{start}:{end}") as ydl:
                                     res = ydl.extract_info(tab_url, download=False)
                                     tab_entries = res.get('entries', [])
                                     if not tab_entries: continue
@@ -444,8 +930,7 @@ def get_video_info(request: VideoRequest):
                 tab_url = f"{base_url}/{yt_tab_map.get(request.tab, request.tab.lower())}"
                 start = (request.offset or 0) + 1
                 end = start + 14
-                ydl_opts = {'quiet': True, 'extract_flat': 'in_playlist', 'playlist_items': f"{start}:{end}"}
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                with pooled_ydl({'quiet': True, 'extract_flat': 'in_playlist'}, playlist_items=f"{start}:{end}") as ydl:
                     res = ydl.extract_info(tab_url, download=False)
                     entries = []
                     for entry in res.get('entries', []):
@@ -460,7 +945,7 @@ def get_video_info(request: VideoRequest):
                         })
                     return {"entries": entries, "next_offset": end if len(entries) >= 15 else None, "is_music": is_music}
 
-            with yt_dlp.YoutubeDL({'quiet': True, 'extract_flat': True}) as ydl:
+            with pooled_ydl({'quiet': True, 'extract_flat': True}) as ydl:
                 res = ydl.extract_info(base_url, download=False)
                 channel_title = res.get('channel') or res.get('uploader') or res.get('title') or base_url.split('/')[-1]
 
@@ -476,21 +961,18 @@ def get_video_info(request: VideoRequest):
 
         if video_id and playlist_id:
             print(f"DEBUG: Combined watch+playlist URL detected. Video: {video_id}, Playlist: {playlist_id}")
-            # 1. Fetch full video metadata
-            ydl_opts_video = {'quiet': True, 'extract_flat': False, 'noplaylist': True}
-            if not is_music:
-                ydl_opts_video.update({
-                    'writesubtitles': True, 'writeautomaticsub': True,
-                    'subtitleslangs': ['en.*', 'en', 'en-US', 'en-GB', '.*']
-                })
-            
-            with yt_dlp.YoutubeDL(ydl_opts_video) as ydl:
-                video_res = ydl.extract_info(f"https://www.youtube.com/watch?v={video_id}", download=False)
-            
-            # 2. Fetch playlist entries (flat)
-            ydl_opts_pl = {'quiet': True, 'extract_flat': 'in_playlist'}
-            with yt_dlp.YoutubeDL(ydl_opts_pl) as ydl:
-                playlist_res = ydl.extract_info(f"https://www.youtube.com/playlist?list={playlist_id}", download=False)
+            def fetch_playlist():
+                with pooled_ydl({'quiet': True, 'extract_flat': 'in_playlist'}) as ydl:
+                    return ydl.extract_info(f"https://www.youtube.com/playlist?list={playlist_id}", download=False)
+
+            # The video and the playlist are independent lookups, so they run side by side
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                # 1. Fetch playlist entries (flat) in the background
+                playlist_future = executor.submit(fetch_playlist)
+                # 2. Fetch full video metadata while the playlist finishes
+                with pooled_ydl(video_info_opts(is_music)) as ydl:
+                    video_res = ydl.extract_info(f"https://www.youtube.com/watch?v={video_id}", download=False)
+                playlist_res = playlist_future.result()
             
             entries = []
             for entry in playlist_res.get('entries', []):
@@ -510,70 +992,119 @@ def get_video_info(request: VideoRequest):
                 # Video metadata
                 "artist": video_res.get('artist') or video_res.get('uploader'), "album": video_res.get('album'),
                 "duration": video_res.get('duration'), "thumbnail": video_res.get('thumbnail'),
-                "formats": [{'format_id': f['format_id'], 'resolution': f"{f.get('height')}p", 'ext': f.get('ext', 'mp4')} for f in video_res.get('formats', []) if f.get('height') and f.get('height') >= 360],
+                "formats": list_formats(video_res),
                 "chapters": [{'title': c.get('title'), 'start': c.get('start_time'), 'end': c.get('end_time')} for c in (video_res.get('chapters') or [])],
-                "heatmap": video_res.get('heatmap') if not is_music else None, "transcript": []
+                "heatmap": video_res.get('heatmap') if not is_music else None
             }
 
-        ydl_opts = {'quiet': True, 'extract_flat': 'in_playlist', 'noplaylist': True}
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        with pooled_ydl({'quiet': True, 'extract_flat': 'in_playlist', 'noplaylist': True}) as ydl:
             result = ydl.extract_info(request.url, download=False)
-            if result.get('_type') == 'playlist' or 'entries' in result:
-                entries = []
-                for entry in result.get('entries', []):
-                    if not entry or not entry.get('id') or entry.get('title') == '[Private video]': continue
-                    entries.append({
-                        'title': entry.get('title') or f"Video {entry.get('id')}",
-                        'url': entry.get('url') or f"https://www.youtube.com/watch?v={entry.get('id')}",
-                        'id': entry.get('id'),
-                        'thumbnail': entry.get('thumbnail') or (entry.get('thumbnails')[0].get('url') if entry.get('thumbnails') else None),
-                        'is_music': is_music
-                    })
-                return {"is_playlist": True, "is_channel": False, "is_music": is_music, "title": result.get('title'), "entries": entries, "original_url": request.url}
-
-            ydl_opts['extract_flat'] = False
-            if not is_music:
-                ydl_opts['writesubtitles'] = True
-                ydl_opts['writeautomaticsub'] = True
-                ydl_opts['subtitleslangs'] = ['en.*', 'en', 'en-US', 'en-GB', '.*']
-            
+        if result.get('_type') == 'playlist' or 'entries' in result:
+            entries = []
+            for entry in result.get('entries', []):
+                if not entry or not entry.get('id') or entry.get('title') == '[Private video]': continue
+                entries.append({
+                    'title': entry.get('title') or f"Video {entry.get('id')}",
+                    'url': entry.get('url') or f"https://www.youtube.com/watch?v={entry.get('id')}",
+                    'id': entry.get('id'),
+                    'thumbnail': entry.get('thumbnail') or (entry.get('thumbnails')[0].get('url') if entry.get('thumbnails') else None),
+                    'is_music': is_music
+                })
+            return {"is_playlist": True, "is_channel": False, "is_music": is_music, "title": result.get('title'), "entries": entries, "original_url": request.url}
+
+        with pooled_ydl(video_info_opts(is_music)) as ydl:
             info = ydl.extract_info(request.url, download=False)
-            return {
-                "is_playlist": False, "is_channel": False, "is_music": is_music,
-                "title": info.get('title'), "artist": info.get('artist') or info.get('uploader'), "album": info.get('album'),
-                "duration": info.get('duration'), "thumbnail": info.get('thumbnail'),
-                "formats": [{'format_id': f['format_id'], 'resolution': f"{f.get('height')}p", 'ext': f.get('ext', 'mp4')} for f in info.get('formats', []) if f.get('height') and f.get('height') >= 360],
-                "chapters": [{'title': c.get('title'), 'start': c.get('start_time'), 'end': c.get('end_time')} for c in (info.get('chapters') or [])],
-                "heatmap": info.get('heatmap') if not is_music else None, "transcript": [], "original_url": request.url
-            }
+        return {
+            "is_playlist": False, "is_channel": False, "is_music": is_music,
+            "title": info.get('title'), "artist": info.get('artist') or info.get('uploader'), "album": info.get('album'),
+            "duration": info.get('duration'), "thumbnail": info.get('thumbnail'),
+            "formats": list_formats(info),
+            "chapters": [{'title': c.get('title'), 'start': c.get('start_time'), 'end': c.get('end_time')} for c in (info.get('chapters') or [])],
+            "heatmap": info.get('heatmap') if not is_music else None, "original_url": request.url
+        }
+    except Exception as e: raise HTTPException(status_code=400, detail=str(e))
+
+def extract_caption_info(url: str) -> dict:
+    try:
+        with pooled_ydl(video_info_opts(False)) as ydl:
+            return ydl.extract_info(url, download=False)
     except Exception as e: raise HTTPException(status_code=400, detail=str(e))
 
+@app.post("/transcript")
+async def get_transcript(request: VideoRequest):
+    """Fetches and parses a video's English captions.
+
+    Kept out of /info, which should not wait on a caption download; the UI asks
+    for this only once the user goes to search the transcript.
+    """
+    async with info_semaphore:
+        info = await asyncio.to_thread(extract_caption_info, request.url)
+    vtt_url = find_vtt_url(info)
+    if not vtt_url: return empty_transcript()
+    try:
+        # httpx's timeout applies per read, so bound the whole download as well
+        return await asyncio.wait_for(fetch_transcript(vtt_url), TRANSCRIPT_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Transcript download timed out")
+
 @app.post("/download")
 async def start_download(request: DownloadRequest):
-    task_id = str(uuid.uuid4())
-    tasks[task_id] = {'status': 'queued', 'progress': 0}
-    asyncio.create_task(download_worker(task_id, request))
+    if download_queue.full(): raise HTTPException(status_code=503, detail="Server busy, try again later")
+    task_id = secrets.token_hex(8)
+    await new_task(task_id)
+    try:
+        download_queue.put_nowait((task_id, request))
+    except asyncio.QueueFull:
+        # Filled up while the task was being registered
+        await expire_task(task_id, 0)
+        raise HTTPException(status_code=503, detail="Server busy, try again later")
     return {"task_id": task_id}
 
 @app.get("/status/{task_id}")
-def get_status(task_id: str):
-    if task_id not in tasks: raise HTTPException(status_code=404, detail="Task not found")
-    return tasks[task_id]
+async def get_status(task_id: str):
+    task = await get_task(task_id)
+    if not task: raise HTTPException(status_code=404, detail="Task not found")
+    return task
+
+@app.websocket("/ws/status/{task_id}")
+async def status_socket(websocket: WebSocket, task_id: str):
+    """Pushes the task's state on every change until it completes or fails."""
+    await websocket.accept()
+    try:
+        async with task_updates(task_id) as next_update:
+            # Subscribe before the first read so no update can slip in between
+            task = await get_task(task_id)
+            if not task:
+                await websocket.close(code=4404)
+                return
+            state = dict(task)
+            await websocket.send_json(state)
+            while state['status'] not in ('completed', 'error'):
+                state.update(await next_update())
+                await websocket.send_json(state)
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+
+class LargeFileResponse(FileResponse):
+    """FileResponse reading 1 MiB per chunk instead of 64 KiB, for multi-GB videos."""
+    chunk_size = 1024 * 1024
 
 @app.get("/download/{task_id}")
-def download_file(task_id: str, background_tasks: BackgroundTasks):
-    if task_id not in tasks or tasks[task_id]['status'] != 'completed': raise HTTPException(status_code=400, detail="File not ready")
-    file_path = tasks[task_id]['file_path']
-    def cleanup():
-        time.sleep(15)
-        cleanup_task_files(task_id)
-        if os.path.exists(file_path): 
-            try: os.remove(file_path)
-            except: pass
-        if task_id in tasks: del tasks[task_id]
-    background_tasks.add_task(cleanup)
-    filename = tasks[task_id].get('download_name', tasks[task_id].get('filename', 'video.mp4'))
-    return FileResponse(file_path, filename=filename)
+async def download_file(task_id: str):
+    task = await get_task(task_id)
+    if not task or task['status'] != 'completed': raise HTTPException(status_code=400, detail="File not ready")
+    file_path = task['file_path']
+    # Give the transfer 15s, then drop the files; a timer on the loop, not a sleeping thread
+    asyncio.get_running_loop().call_later(15, deletion_queue.put_nowait, task_id)
+    await expire_task(task_id, 15)
+    filename = task.get('download_name', task.get('filename', 'video.mp4'))
+    try:
+        # Starlette skips its own stat when given one, and the size becomes Content-Length up front
+        stat_result = await asyncio.to_thread(os.stat, file_path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="File no longer available")
+    return LargeFileResponse(file_path, filename=filename, stat_result=stat_result)
 
 if __name__ == "__main__":
     import uvicorn
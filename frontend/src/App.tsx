@@ -21,9 +21,10 @@ interface HeatmapPoint {
   value: number;
 }
 
-interface TranscriptLine {
-  start: number;
-  text: string;
+// Parallel arrays: cue i starts at start[i] seconds and reads text[i]
+interface Transcript {
+  start: number[];
+  text: string[];
 }
 
 interface PlaylistEntry {
@@ -50,7 +51,7 @@ interface VideoInfo {
   formats: VideoFormat[];
   chapters: Chapter[];
   heatmap?: HeatmapPoint[];
-  transcript?: TranscriptLine[];
+  transcript?: Transcript;
   original_url: string;
 }
 
@@ -73,6 +74,7 @@ interface Clip {
 }
 
 const API_BASE = import.meta.env.VITE_API_BASE || "http://localhost:8000";
+const WS_BASE = API_BASE.replace(/^http/, 'ws');
 
 declare global {
   interface Window {
@@ -103,6 +105,8 @@ function App() {
   const [hasMore, setHasMore] = useState(true);
 
   const downloadedTaskIds = useRef<Set<string>>(new Set());
+  const statusSockets = useRef<Map<string, WebSocket>>(new Map());
+  const [reconnectTick, setReconnectTick] = useState(0);
   const playerRef = useRef<any>(null);
   const [playerReady, setPlayerReady] = useState(false);
 
@@ -120,40 +124,36 @@ function App() {
 
   useEffect(() => {
     const activeClips = clips.filter(c => (c.status === 'processing' || c.status === 'queued') && c.taskId);
-    if (activeClips.length === 0) return;
-
-    const interval = setInterval(async () => {
-      let changed = false;
-      const updatedClips = [...clips];
-
-      await Promise.all(activeClips.map(async (clip) => {
-        if (!clip.taskId) return;
-        try {
-          const res = await axios.get(`${API_BASE}/status/${clip.taskId}`);
-          const data = res.data;
-          
-          const idx = updatedClips.findIndex(c => c.id === clip.id);
-          if (idx !== -1) {
-            if (updatedClips[idx].progress !== data.progress || updatedClips[idx].status !== data.status) {
-              updatedClips[idx] = { ...updatedClips[idx], status: data.status, progress: data.progress };
-              changed = true;
-              
-              if (data.status === 'completed' && !downloadedTaskIds.current.has(clip.taskId)) {
-                downloadedTaskIds.current.add(clip.taskId);
-                finalizeDownload(clip.taskId, clip.title, clip.includeAudio, clip.isCollection);
-              }
-            }
-          }
-        } catch (e) {
-          console.error("Status check failed", e);
-        }
-      }));
 
-      if (changed) setClips(updatedClips);
-    }, 1000);
+    activeClips.forEach(clip => {
+      const taskId = clip.taskId!;
+      if (statusSockets.current.has(taskId)) return;
 
-    return () => clearInterval(interval);
-  }, [clips]);
+      // The backend pushes the task state on every change and closes once it is done
+      const ws = new WebSocket(`${WS_BASE}/ws/status/${taskId}`);
+      statusSockets.current.set(taskId, ws);
+      let finished = false;
+
+      ws.onmessage = (event) => {
+        const data = JSON.parse(event.data);
+        finished = data.status === 'completed' || data.status === 'error';
+        setClips(prev => prev.map(c => c.taskId === taskId ? { ...c, status: data.status, progress: data.progress } : c));
+
+        if (data.status === 'completed' && !downloadedTaskIds.current.has(taskId)) {
+          downloadedTaskIds.current.add(taskId);
+          finalizeDownload(taskId, clip.title, clip.includeAudio, clip.isCollection);
+        }
+      };
+      ws.onerror = (e) => console.error("Status socket failed", e);
+      ws.onclose = () => {
+        statusSockets.current.delete(taskId);
+        // Dropped before the task finished: reconnect shortly
+        if (!finished) setTimeout(() => setReconnectTick(t => t + 1), 1000);
+      };
+    });
+  }, [clips, reconnectTick]);
+
+  useEffect(() => () => statusSockets.current.forEach(ws => ws.close()), []);
 
   useEffect(() => {
     const activeInfo = selectedVideoInfo || info;
@@ -419,6 +419,18 @@ function App() {
     }
   };
 
+  const loadTranscript = async (target: VideoInfo) => {
+    if (target.transcript) return;
+    try {
+      const res = await axios.post(`${API_BASE}/transcript`, { url: target.original_url });
+      const withTranscript = (v: VideoInfo | null) => v === target ? { ...v, transcript: res.data } : v;
+      setSelectedVideoInfo(withTranscript);
+      setInfo(withTranscript);
+    } catch (err) {
+      console.error("Failed to load transcript", err);
+    }
+  };
+
   const activeInfo = (selectedVideoInfo && !selectedVideoInfo.is_channel) 
     ? selectedVideoInfo 
     : (info && !info.is_channel ? info : null);
@@ -473,10 +485,10 @@ function App() {
                   <Clock size={16} style={{marginRight: '5px'}} /> Mark Current Time
                 </button>
 
-                {activeInfo.transcript && activeInfo.transcript.length > 0 && (
+                {!activeInfo.is_music && (
                   <div className="transcript-search-wrapper">
                     <Search size={14} style={{position: 'absolute', left: '10px', top: '50%', transform: 'translateY(-50%)', color: '#666'}}/>
-                    <input type="text" className="transcript-search-input" placeholder="Search transcript..." value={transcriptSearch} onChange={(e) => setTranscriptSearch(e.target.value)} />
+                    <input type="text" className="transcript-search-input" placeholder="Search transcript..." value={transcriptSearch} onFocus={() => loadTranscript(activeInfo)} onChange={(e) => setTranscriptSearch(e.target.value)} />
                   </div>
                 )}
               </div>